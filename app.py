@@ -1,87 +1,340 @@
-from flask import Flask, render_template, request, jsonify
+from gevent import monkey
+monkey.patch_all()  # cooperative sockets so GitHub calls don't block other requests
+
+from flask import Flask, Response, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+import orjson
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime
+import functools
+import itertools
+from collections import OrderedDict
+from operator import itemgetter
+from sortedcontainers import SortedKeyList
+import hmac
 import os
+import queue
+import sys
 import threading
 import time
 
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify/request.json through orjson's C encoder/decoder"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, no str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+MAX_EVENTS = 100  # per repo
+MAX_REPOS = 50  # partitions - bounds memory whatever repo names webhooks/lookups bring in
+RETENTION = 86400  # seconds - events older than 24hr are purged from the store
+DASHBOARD_TTL = 10  # seconds - browsers/CDNs may share the dashboard page this long
+POLL_INTERVAL = 300  # seconds - polling is only a fallback, webhooks come first
+
+GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+WEBHOOK_SECRET = os.environb.get(b'GITHUB_WEBHOOK_SECRET', b'')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+
+# Pooled keep-alive connections to api.github.com
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50,
+                                   max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+http.headers['Accept'] = 'application/vnd.github+json'
+if GITHUB_TOKEN:
+    http.headers['Authorization'] = f'Bearer {GITHUB_TOKEN}'
+
+# Payload fields kept on stored events ('commits' is kept as a count)
+PAYLOAD_KEYS = ('ref', 'action', 'number', 'title')
 
-# Thread-safe event storage
-events_store = []
+# Webhook subscriptions → Events API type names
+WEBHOOK_EVENT_TYPES = {
+    'push': 'PushEvent',
+    'pull_request': 'PullRequestEvent',
+    'issues': 'IssuesEvent',
+    'check_run': 'CheckRunEvent',
+}
+
+# Thread-safe event storage partitioned by repo, each oldest → newest by precomputed epoch '_ts'
+events_by_repo = OrderedDict()  # least → most recently written
+seen_ids = set()  # '_key's currently stored in any repo, for O(1) dedup across webhook/poll
+events_count = 0  # running total across all repos, kept in step with inserts/expiry/drops
 store_lock = threading.Lock()
 
+# Raw webhook deliveries waiting for _wh_consumer
+wh_queue = queue.Queue(maxsize=10000)
+WEBHOOK_BATCH = 64
+
+# Repos kept fresh by the fallback poller - only the configured ones, so ad-hoc
+# ?repo= lookups can't grow the background polling load
+watched_repos = {r.strip() for r in os.environ.get('GITHUB_REPOS', '').split(',') if '/' in r}
+etag_cache = {}  # repo → last ETag, 304s don't count against the rate limit
+poll_after = {}  # repo → earliest epoch for the next poll (X-Poll-Interval, else POLL_INTERVAL)
+
+_NOW = time.time  # all internal timestamps are float epoch seconds
+
 def parse_github_time(iso_string):
-    """Fix timezone issue - make GitHub time comparable"""
+    """GitHub ISO time (YYYY-MM-DDTHH:MM:SSZ) → epoch seconds (UTC)"""
     if not iso_string:
-        return datetime.utcnow()
+        return _NOW()
     
-    # Remove timezone info for simple comparison
-    dt = datetime.fromisoformat(iso_string.replace('Z', '+00:00')[:19])
-    return dt
+    # Single C-level parse; fromisoformat only accepts a trailing 'Z' from Python 3.11
+    return datetime.fromisoformat(iso_string.replace('Z', '+00:00')).timestamp()
+
+@functools.lru_cache(maxsize=1024)
+def _iso(ts):
+    """Epoch seconds → GitHub-style ISO string, at whole-second resolution"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+
+@functools.lru_cache(maxsize=1024)
+def _display_minute(minute):
+    return time.strftime('%Y-%m-%d %H:%M IST', time.gmtime(minute * 60))
+
+def format_time(ts):
+    """Epoch seconds → dashboard time string, memoized per minute"""
+    return _display_minute(int(ts // 60))
+
+def project_payload(payload):
+    """Keep only the small fields worth showing - never repr the whole payload tree"""
+    projected = {k: payload[k] for k in PAYLOAD_KEYS if k in payload}
+    if 'commits' in payload:
+        projected['commits'] = len(payload['commits'])
+    if 'title' not in projected:
+        subject = payload.get('pull_request') or payload.get('issue') or {}
+        if 'title' in subject:
+            projected['title'] = subject['title']
+    return projected
+
+def activity_key(repo, event_type, payload, fallback_id):
+    """Source-independent identity, so a webhook and the polled copy of the same activity dedup
+    
+    Webhook pushes carry the head sha as 'after', the Events API as 'head'.
+    """
+    if event_type == 'PushEvent':
+        ident = payload.get('after') or payload.get('head')
+    elif event_type == 'PullRequestEvent':
+        ident = payload.get('number')
+    elif event_type == 'IssuesEvent':
+        ident = (payload.get('issue') or {}).get('number')
+    else:
+        ident = None
+    if ident is None:
+        return fallback_id
+    return f"{repo}:{event_type}:{ident}:{payload.get('action', '')}"
+
+def project_actor(actor, default_login):
+    """Only what the dashboard renders - login strings are interned, they repeat a lot"""
+    return {'login': sys.intern(actor.get('login') or default_login), 'avatar_url': actor.get('avatar_url')}
+
+def expire_events(now=None):
+    """Drop events older than RETENTION from every repo - caller holds store_lock"""
+    cutoff_ts = (now or _NOW()) - RETENTION
+    for repo in list(events_by_repo):
+        events = events_by_repo[repo]
+        _drop_oldest(events, events.bisect_key_left(cutoff_ts))
+        if not events:
+            del events_by_repo[repo]
+
+def _drop_oldest(events, count):
+    global events_count
+    if count:
+        seen_ids.difference_update(e['_key'] for e in events.islice(0, count))
+        del events[:count]
+        events_count -= count
+
+def _evict_repo(repo, reason):
+    """Drop a whole repo partition - caller holds store_lock"""
+    global events_count
+    events = events_by_repo.pop(repo)
+    seen_ids.difference_update(e['_key'] for e in events)
+    events_count -= len(events)
+    # Its ETag would 304 the next poll and keep the repo empty
+    etag_cache.pop(repo, None)
+    print(f"Evicted {len(events)} events for {repo} ({reason})")
+
+def store_event(event):
+    """Insert into the event's repo by event['_ts'] in O(log N) - caller holds store_lock
+    
+    Returns False if an event with the same '_key' is already stored. A new repo
+    arriving while MAX_REPOS partitions are in use evicts the least recently
+    written one, preferring repos that aren't in watched_repos.
+    """
+    if event['_key'] in seen_ids:
+        return False
+    
+    global events_count
+    repo = event['repo']
+    events = events_by_repo.get(repo)
+    if events is None:
+        if len(events_by_repo) >= MAX_REPOS:
+            expire_events()  # reclaims partitions that have emptied out
+            if len(events_by_repo) >= MAX_REPOS:
+                victim = next((r for r in events_by_repo if r not in watched_repos), next(iter(events_by_repo)))
+                _evict_repo(victim, reason=f"making room for {repo}")
+        events = events_by_repo[repo] = SortedKeyList(key=itemgetter('_ts'))
+    else:
+        events_by_repo.move_to_end(repo)
+    events.add(event)
+    seen_ids.add(event['_key'])
+    events_count += 1
+    
+    # Keep only the last 24hr, at most 100 events in this repo - other partitions are
+    # expired once per batch by the callers
+    _drop_oldest(events, events.bisect_key_left(_NOW() - RETENTION))
+    if len(events) > MAX_EVENTS:
+        _drop_oldest(events, len(events) - MAX_EVENTS)
+    return True
+
+def recent_events(repo):
+    """Last 24hr events for one repo, newest first - caller holds store_lock"""
+    events = events_by_repo.get(repo)
+    if not events:
+        return iter(())
+    return events.irange_key(min_key=_NOW() - RETENTION, reverse=True)
 
 @app.route('/')
 def dashboard():
-    """Main dashboard - last 24hr events only"""
-    cutoff = datetime.utcnow() - timedelta(hours=24)
+    """Main dashboard - static shell, events are loaded client-side from /api/events"""
+    return Response(render_template('index.html'),
+                    headers={'Cache-Control': f'public, max-age={DASHBOARD_TTL}'})
+
+def _poll_github(repo):
+    """GitHub API → Store, returns newly stored events or None if unchanged (per_page=100 REQUIRED)"""
+    # GitHub API - EXACT ASSIGNMENT REQUIREMENT
+    url = f"https://api.github.com/repos/{repo}/events?per_page=100"
+    headers = {'If-None-Match': etag_cache[repo]} if repo in etag_cache else {}
+    response = http.get(url, headers=headers, timeout=10)
     
+    poll_after[repo] = _NOW() + int(response.headers.get('X-Poll-Interval', POLL_INTERVAL))
+    
+    if response.status_code == 304:
+        return None
+    
+    response.raise_for_status()
+    api_events = orjson.loads(response.content)
+    
+    # Clean event data - parse each created_at once into '_ts', keep last 24hr only
+    cutoff_ts = _NOW() - RETENTION
+    candidates = []
+    for event in api_events:
+        event_id = event.get('id')
+        ts = parse_github_time(event.get('created_at'))
+        
+        if event_id and ts > cutoff_ts:
+            display_event = {
+                'id': event_id,
+                'type': sys.intern(event['type']),
+                'actor': project_actor(event.get('actor') or {}, 'unknown'),
+                'created_at': event['created_at'],
+                'formatted_time': format_time(ts),
+                'payload': project_payload(event.get('payload') or {}),
+                'repo': sys.intern(repo),
+                'source': 'github_api',
+                '_ts': ts,
+                '_key': activity_key(repo, event['type'], event.get('payload') or {}, event_id)
+            }
+            candidates.append(display_event)
+    
+    # Store the whole batch in one lock window, seen_ids drops duplicates
+    fresh_events = []
+    complete = True
     with store_lock:
-        recent_events = [e for e in events_store 
-                        if parse_github_time(e.get('created_at')) > cutoff]
+        expire_events()
+        for display_event in candidates:
+            if store_event(display_event):
+                fresh_events.append(display_event)
+            elif display_event['_key'] not in seen_ids:
+                complete = False
     
-    return render_template('index.html', events=recent_events)
+    # Only remember the ETag once every event is held, otherwise a 304 would hide the missing ones
+    if complete and 'ETag' in response.headers:
+        etag_cache[repo] = response.headers['ETag']
+    return fresh_events
+
+def _poll_all():
+    """Fallback safety net - catch anything the webhooks missed"""
+    now = _NOW()
+    with store_lock:
+        expire_events(now)
+        repos = list(watched_repos)
+    for repo in repos:
+        if poll_after.get(repo, 0) > now:
+            continue
+        try:
+            _poll_github(repo)
+        except Exception as e:
+            print(f"Poll error for {repo}: {e}")
+    schedule_poll()
+
+def schedule_poll(delay=POLL_INTERVAL):
+    timer = threading.Timer(delay, _poll_all)
+    timer.daemon = True
+    timer.start()
+
+def register_webhook(repo):
+    """Subscribe WEBHOOK_URL to the repo's push/PR/issue/check_run events"""
+    response = http.post(
+        f"https://api.github.com/repos/{repo}/hooks",
+        json={
+            'name': 'web',
+            'active': True,
+            'events': list(WEBHOOK_EVENT_TYPES),
+            'config': {'url': WEBHOOK_URL, 'content_type': 'json', 'secret': WEBHOOK_SECRET.decode()},
+        },
+        timeout=15,
+    )
+    # 422 = hook already exists
+    if response.status_code != 422:
+        response.raise_for_status()
+
+def verify_signature(body, signature):
+    """Check X-Hub-Signature-256 against WEBHOOK_SECRET"""
+    if not signature or not signature.startswith('sha256='):
+        return False
+    # One-shot OpenSSL HMAC, constant-time compare on bytes (str compare raises on non-ASCII)
+    expected = hmac.digest(WEBHOOK_SECRET, body, 'sha256').hex().encode()
+    return hmac.compare_digest(expected, signature.removeprefix('sha256=').encode('latin-1'))
 
 @app.route('/api/events')
 def fetch_events():
-    """GitHub API → Store → Return (per_page=100 REQUIRED)"""
+    """Cached events for a repo - conditional GitHub poll on first sight, once poll_after passes, or ?force=1"""
     repo = request.args.get('repo', 'torvalds/linux').strip()
     
     if '/' not in repo:
         return jsonify({'error': 'Use format: owner/repo'}), 400
     
+    limit = max(0, min(request.args.get('limit', 5, type=int), MAX_EVENTS))
+    
     try:
-        # GitHub API - EXACT ASSIGNMENT REQUIREMENT
-        url = f"https://api.github.com/repos/{repo}/events?per_page=100"
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        api_events = response.json()
-        
-        # Process and deduplicate
-        cutoff = datetime.utcnow() - timedelta(hours=24)
-        existing_ids = {e.get('id') for e in events_store}
         fresh_events = []
+        if (repo not in etag_cache or _NOW() >= poll_after.get(repo, 0)
+                or request.args.get('force') == '1'):
+            fresh_events = _poll_github(repo)
         
-        for event in api_events:
-            event_id = event.get('id')
-            event_time = parse_github_time(event.get('created_at'))
-            
-            if (event_id and event_id not in existing_ids and event_time > cutoff):
-                # Clean event data
-                display_event = {
-                    'id': event_id,
-                    'type': event['type'],
-                    'actor': event.get('actor', {'login': 'unknown'}),
-                    'created_at': event['created_at'],
-                    'formatted_time': event_time.strftime('%Y-%m-%d %H:%M IST'),
-                    'payload': str(event.get('payload', {}))[:200] + '...',
-                    'repo': repo,
-                    'source': 'github_api'
-                }
-                
-                with store_lock:
-                    events_store.append(display_event)
-                    # Keep only recent 100 events
-                    events_store[:] = sorted(events_store, key=lambda x: parse_github_time(x.get('created_at')), reverse=True)[:100]
-                
-                fresh_events.append(display_event)
-                existing_ids.add(event_id)
+        with store_lock:
+            expire_events()
+            # Only this repo's partition, newest first
+            sample_events = list(itertools.islice(recent_events(repo), limit))
+            total_events = events_count
         
         return jsonify({
-            'status': 'success',
+            'status': 'unchanged' if fresh_events is None else 'success',
             'repo': repo,
-            'new_events': len(fresh_events),
-            'total_events': len(events_store),
-            'sample_events': fresh_events[:5]
+            'new_events': len(fresh_events or []),
+            'total_events': total_events,
+            'sample_events': sample_events
         })
         
     except requests.RequestException as e:
@@ -89,49 +342,111 @@ def fetch_events():
     except Exception as e:
         return jsonify({'error': f'Server Error: {str(e)}'}), 500
 
-@app.route('/webhook', methods=['POST'])
-def github_webhook():
-    """GitHub Webhook receiver - BONUS POINTS!"""
-    try:
-        data = request.get_json() or {}
-        webhook_event = {
-            'id': f"webhook_{int(time.time()*1000)}",
-            'type': data.get('action', 'webhook_event'),
-            'actor': {'login': data.get('sender', {}).get('login', 'github-webhook')},
-            'created_at': datetime.utcnow().isoformat() + 'Z',
-            'formatted_time': datetime.utcnow().strftime('%Y-%m-%d %H:%M IST'),
-            'payload': str(data)[:200] + '...',
-            'repo': data.get('repository', {}).get('full_name', 'webhook'),
-            'source': 'github_webhook'
-        }
+def _build_webhook_event(gh_event, delivery_id, body, received_at):
+    """Webhook payload → display_event"""
+    data = orjson.loads(body or b'{}')
+    sender = data.get('sender', {})
+    event_id = delivery_id or f"webhook_{int(received_at*1000)}"
+    event_type = sys.intern(WEBHOOK_EVENT_TYPES.get(gh_event, data.get('action', 'webhook_event')))
+    repo = sys.intern(data.get('repository', {}).get('full_name', 'webhook'))
+    return {
+        'id': event_id,
+        'type': event_type,
+        'actor': project_actor(sender, 'github-webhook'),
+        'created_at': _iso(int(received_at)),
+        'formatted_time': format_time(received_at),
+        'payload': project_payload(data),
+        'repo': repo,
+        'source': 'github_webhook',
+        '_ts': received_at,
+        '_key': activity_key(repo, event_type, data, event_id)
+    }
+
+def _wh_consumer():
+    """Drain wh_queue off the request path, storing up to WEBHOOK_BATCH per lock hold"""
+    while True:
+        batch = [wh_queue.get()]
+        while len(batch) < WEBHOOK_BATCH:
+            try:
+                batch.append(wh_queue.get_nowait())
+            except queue.Empty:
+                break
         
-        with store_lock:
-            events_store.insert(0, webhook_event)
-            events_store[:] = sorted(events_store, key=lambda x: parse_github_time(x.get('created_at')), reverse=True)[:100]
+        # Parse outside the lock
+        webhook_events = []
+        for item in batch:
+            try:
+                webhook_events.append(_build_webhook_event(*item))
+            except Exception as e:
+                print(f"Webhook error: {e}")
         
-        print(f"✅ WEBHOOK RECEIVED: {webhook_event['type']} from {webhook_event['repo']}")
-        return jsonify({'status': 'success', 'event': webhook_event['type']}), 200
+        with store_lock:
+            expire_events()
+            stored = [e for e in webhook_events if store_event(e)]
         
-    except Exception as e:
-        print(f"Webhook error: {e}")
-        return jsonify({'error': str(e)}), 400
+        for webhook_event in stored:
+            print(f"✅ WEBHOOK RECEIVED: {webhook_event['type']} from {webhook_event['repo']}")
+
+@app.route('/webhook', methods=['POST'])
+def github_webhook():
+    """GitHub Webhook receiver - primary ingestion path, queues and returns 202"""
+    if not WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhook secret not configured'}), 503
+    
+    # Reject unsigned/forged deliveries before any parsing
+    body = request.get_data(cache=False)
+    if not verify_signature(body, request.headers.get('X-Hub-Signature-256')):
+        return jsonify({'error': 'Invalid signature'}), 401
+    
+    gh_event = request.headers.get('X-GitHub-Event', '')
+    if gh_event == 'ping':
+        return jsonify({'status': 'pong'}), 200
+    
+    try:
+        wh_queue.put_nowait((gh_event, request.headers.get('X-GitHub-Delivery'), body, _NOW()))
+    except queue.Full:
+        return jsonify({'error': 'Webhook queue full'}), 503
+    
+    return '', 202
 
 @app.route('/clear')
 def clear_events():
     """Clear all events for testing"""
+    global events_count
     with store_lock:
-        events_store.clear()
+        events_by_repo.clear()
+        seen_ids.clear()
+        events_count = 0
+    # Stale ETags would 304 the next poll and leave the store empty
+    etag_cache.clear()
     return jsonify({'status': 'cleared', 'total': 0})
 
 @app.route('/status')
 def status():
     """Health check"""
+    with store_lock:
+        expire_events()
     return jsonify({
         'status': 'healthy',
-        'events_count': len(events_store),
+        'events_count': events_count,
         'uptime': 'production'
     })
 
+if GITHUB_TOKEN and WEBHOOK_URL and not WEBHOOK_SECRET:
+    print("⚠️ GITHUB_WEBHOOK_SECRET not set - skipping webhook registration")
+elif GITHUB_TOKEN and WEBHOOK_URL:
+    for _repo in watched_repos:
+        try:
+            register_webhook(_repo)
+        except requests.RequestException as e:
+            print(f"Webhook registration failed for {_repo}: {e}")
+
+if not WEBHOOK_SECRET:
+    print("⚠️ GITHUB_WEBHOOK_SECRET not set - /webhook rejects all deliveries")
+
+schedule_poll(0)  # fill configured repos right away, then every POLL_INTERVAL
+threading.Thread(target=_wh_consumer, daemon=True).start()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)